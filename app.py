@@ -1,7 +1,7 @@
 import streamlit as st
 import requests
-import json
-import pandas as pd
+from requests.adapters import HTTPAdapter
+import html
 from datetime import datetime
 import time
 
@@ -76,8 +76,36 @@ st.markdown("""
 # Rasa server configuration
 RASA_SERVER_URL = "http://localhost:5005/webhooks/rest/webhook"
 RASA_HEALTH_URL = "http://localhost:5005"
+# (connect, read) timeouts in seconds
+HEALTH_TIMEOUT = (1, 1)
+MESSAGE_TIMEOUT = (1, 15)
+
+# Only the most recent messages are rendered; older ones move to an archive
+MAX_VISIBLE_MESSAGES = 100
+
+@st.cache_resource
+def get_http_session():
+    """Shared HTTP session so Rasa calls reuse keep-alive connections"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
+def add_message(sender, message):
+    """Append a message to the chat history and update the chat statistics"""
+    st.session_state.messages.append({
+        "sender": sender,
+        "message": message,
+        "timestamp": datetime.now()
+    })
+    st.session_state[f"{sender}_count"] += 1
+    if len(st.session_state.messages) > MAX_VISIBLE_MESSAGES:
+        st.session_state.archive.extend(st.session_state.messages[:-MAX_VISIBLE_MESSAGES])
+        st.session_state.messages = st.session_state.messages[-MAX_VISIBLE_MESSAGES:]
 
 # Initialize session state
+st.session_state.setdefault("user_count", 0)
+st.session_state.setdefault("bot_count", 0)
+st.session_state.setdefault("archive", [])
 if "messages" not in st.session_state:
     st.session_state.messages = []
     # Add welcome message
@@ -99,19 +127,16 @@ Try asking me something like:
 
 What would you like to know? 😊"""
 
-    st.session_state.messages.append({
-        "sender": "bot",
-        "message": welcome_msg,
-        "timestamp": datetime.now()
-    })
+    add_message("bot", welcome_msg)
 
 if "user_id" not in st.session_state:
     st.session_state.user_id = f"streamlit_user_{int(time.time())}"
 
+@st.cache_data(ttl=5.0, show_spinner=False)
 def check_rasa_connection():
-    """Check if Rasa server is running"""
+    """Check if Rasa server is running (result cached for a few seconds)"""
     try:
-        response = requests.get(RASA_HEALTH_URL, timeout=3)
+        response = get_http_session().get(RASA_HEALTH_URL, timeout=HEALTH_TIMEOUT)
         return response.status_code == 200
     except:
         return False
@@ -127,10 +152,10 @@ def send_message_to_rasa(message, user_id=None):
             "message": message
         }
         
-        response = requests.post(
+        response = get_http_session().post(
             RASA_SERVER_URL,
             json=payload,
-            timeout=15
+            timeout=MESSAGE_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -145,30 +170,26 @@ def send_message_to_rasa(message, user_id=None):
     except Exception as e:
         return [{"text": f"❌ An error occurred: {str(e)}"}]
 
-def display_message(message, sender, timestamp):
-    """Display a chat message with proper styling"""
+def render_message(message, sender, timestamp):
+    """Build the HTML for one chat message with proper styling"""
+    # Escape and keep everything on one line so the whole transcript stays a
+    # single HTML block when rendered with one st.markdown call
+    body = html.escape(message).replace("\n", "<br>")
     if sender == "user":
-        st.markdown(f"""
-        <div style="display: flex; justify-content: flex-end; margin: 10px 0;">
-            <div class="user-message">
-                {message}
-                <div class="timestamp" style="color: rgba(255,255,255,0.8);">
-                    {timestamp.strftime('%H:%M')}
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown(f"""
-        <div style="display: flex; justify-content: flex-start; margin: 10px 0;">
-            <div class="bot-message">
-                {message}
-                <div class="timestamp">
-                    🤖 Bot • {timestamp.strftime('%H:%M')}
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        return (
+            '<div style="display: flex; justify-content: flex-end; margin: 10px 0;">'
+            f'<div class="user-message">{body}'
+            '<div class="timestamp" style="color: rgba(255,255,255,0.8);">'
+            f"{timestamp.strftime('%H:%M')}"
+            '</div></div></div>'
+        )
+    return (
+        '<div style="display: flex; justify-content: flex-start; margin: 10px 0;">'
+        f'<div class="bot-message">{body}'
+        '<div class="timestamp">'
+        f"🤖 Bot • {timestamp.strftime('%H:%M')}"
+        '</div></div></div>'
+    )
 
 # Main app layout
 st.title("📚 Book Recommendation Chatbot")
@@ -221,12 +242,15 @@ with st.sidebar:
         "Show me the book cover for 1984"
     ]
     
-    selected_command = st.selectbox(
-        "Choose a sample question:",
-        ["Select an example..."] + quick_commands
-    )
+    # Form so browsing the examples doesn't rerun the app until submitted
+    with st.form("example_form"):
+        selected_command = st.selectbox(
+            "Choose a sample question:",
+            ["Select an example..."] + quick_commands
+        )
+        use_example = st.form_submit_button("📤 Use This Example")
     
-    if st.button("📤 Use This Example") and selected_command != "Select an example...":
+    if use_example and selected_command != "Select an example...":
         st.session_state.selected_example = selected_command
     
     st.markdown("---")
@@ -236,23 +260,21 @@ with st.sidebar:
     
     if st.button("🗑️ Clear Chat History", type="secondary"):
         st.session_state.messages = []
-        st.session_state.messages.append({
-            "sender": "bot",
-            "message": "Chat cleared! 🧹 How can I help you find books today?",
-            "timestamp": datetime.now()
-        })
+        st.session_state.archive = []
+        st.session_state.user_count = 0
+        st.session_state.bot_count = 0
+        add_message("bot", "Chat cleared! 🧹 How can I help you find books today?")
         st.experimental_rerun()
     
     if st.button("🔄 Refresh Connection"):
+        check_rasa_connection.clear()
         st.experimental_rerun()
     
     # Statistics
     st.markdown("---")
     st.header("📊 Chat Statistics")
-    user_msgs = sum(1 for msg in st.session_state.messages if msg["sender"] == "user")
-    bot_msgs = sum(1 for msg in st.session_state.messages if msg["sender"] == "bot")
-    st.metric("Your Messages", user_msgs)
-    st.metric("Bot Responses", bot_msgs)
+    st.metric("Your Messages", st.session_state.user_count)
+    st.metric("Bot Responses", st.session_state.bot_count)
 
 # Main chat area
 col1, col2 = st.columns([3, 1])
@@ -260,13 +282,22 @@ col1, col2 = st.columns([3, 1])
 with col1:
     st.header("💬 Chat")
     
-    # Create chat container
-    chat_container = st.container()
+    # Older messages are only rendered on demand
+    visible_messages = st.session_state.messages
+    if st.session_state.archive:
+        # Fixed label: a changing label would give the checkbox a new widget id
+        # and reset it every time a message is archived
+        show_older = st.checkbox("📜 Show older messages", key="show_archive")
+        st.caption(f"{len(st.session_state.archive)} older messages archived")
+        if show_older:
+            visible_messages = st.session_state.archive + visible_messages
     
-    # Display all messages
-    with chat_container:
-        for msg in st.session_state.messages:
-            display_message(msg["message"], msg["sender"], msg["timestamp"])
+    # Display all messages in a single render call
+    html_parts = [
+        render_message(msg["message"], msg["sender"], msg["timestamp"])
+        for msg in visible_messages
+    ]
+    st.markdown("".join(html_parts), unsafe_allow_html=True)
     
     # Handle example selection
     if hasattr(st.session_state, 'selected_example'):
@@ -274,11 +305,7 @@ with col1:
         del st.session_state.selected_example
         
         # Add user message
-        st.session_state.messages.append({
-            "sender": "user",
-            "message": user_input,
-            "timestamp": datetime.now()
-        })
+        add_message("user", user_input)
         
         # Get bot response
         if rasa_online:
@@ -288,17 +315,9 @@ with col1:
             # Add bot responses
             for response in bot_responses:
                 bot_message = response.get("text", "I'm sorry, I didn't understand that. Could you please rephrase?")
-                st.session_state.messages.append({
-                    "sender": "bot",
-                    "message": bot_message,
-                    "timestamp": datetime.now()
-                })
+                add_message("bot", bot_message)
         else:
-            st.session_state.messages.append({
-                "sender": "bot", 
-                "message": "❌ I can't process your request right now because the Rasa server is not running. Please check the connection status in the sidebar.",
-                "timestamp": datetime.now()
-            })
+            add_message("bot", "❌ I can't process your request right now because the Rasa server is not running. Please check the connection status in the sidebar.")
         
         st.experimental_rerun()
 
@@ -338,11 +357,7 @@ with st.form("message_form", clear_on_submit=True):
 # Handle form submission
 if send_button and user_input.strip():
     # Add user message to chat
-    st.session_state.messages.append({
-        "sender": "user", 
-        "message": user_input.strip(),
-        "timestamp": datetime.now()
-    })
+    add_message("user", user_input.strip())
     
     # Get bot response
     if rasa_online:
@@ -352,18 +367,10 @@ if send_button and user_input.strip():
         # Add bot responses to chat
         for response in bot_responses:
             bot_message = response.get("text", "I'm sorry, I didn't understand that. Could you please rephrase your question?")
-            st.session_state.messages.append({
-                "sender": "bot",
-                "message": bot_message,
-                "timestamp": datetime.now()
-            })
+            add_message("bot", bot_message)
     else:
         # Server offline message
-        st.session_state.messages.append({
-            "sender": "bot",
-            "message": "❌ I can't process your request right now because the Rasa server is not running.\n\nTo fix this:\n1. Open a terminal in your Rasa project directory\n2. Run: `rasa run --enable-api --cors \"*\" --port 5005`\n3. Wait for the server to start\n4. Refresh this page",
-            "timestamp": datetime.now()
-        })
+        add_message("bot", "❌ I can't process your request right now because the Rasa server is not running.\n\nTo fix this:\n1. Open a terminal in your Rasa project directory\n2. Run: `rasa run --enable-api --cors \"*\" --port 5005`\n3. Wait for the server to start\n4. Refresh this page")
     
     # Rerun to show new messages
     st.experimental_rerun()